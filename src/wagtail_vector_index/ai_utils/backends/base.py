@@ -1,4 +1,4 @@
-from collections.abc import Iterable, Iterator, Sequence
+from collections.abc import AsyncIterator, Iterable, Iterator, Sequence
 from dataclasses import dataclass
 from typing import (
     Any,
@@ -221,7 +221,7 @@ class BaseEmbeddingBackend(BaseBackend[EmbeddingBackendConfig]):
 
     def embed(self, inputs: Iterable[str], **kwargs) -> Iterator[list[float]]: ...
 
-    async def aembed(self, inputs: Iterable[str]) -> Iterator[list[float]]:
+    def aembed(self, inputs: Iterable[str], **kwargs) -> AsyncIterator[list[float]]:
         raise NotImplementedError("Async embed is not supported by this backend.")
 
     @property
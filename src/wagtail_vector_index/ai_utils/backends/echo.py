@@ -4,7 +4,7 @@ They are intended for testing and development purposes and are not suitable for
 
 import random
 import time
-from collections.abc import Generator, Iterable, Iterator, Sequence
+from collections.abc import AsyncIterator, Generator, Iterable, Iterator, Sequence
 from dataclasses import dataclass
 from typing import Any, NotRequired, Self
 
@@ -103,11 +103,14 @@ class EchoEmbeddingBackend(BaseEmbeddingBackend[BaseEmbeddingConfig]):
     config_cls = BaseEmbeddingConfig
     config: BaseEmbeddingConfig
 
-    def embed(self, inputs: Iterable[Document]) -> Iterator[list[float]]:
+    def embed(self, inputs: Iterable[Document], **kwargs) -> Iterator[list[float]]:
         for _ in inputs:
             yield [
                 random.random() for _ in range(self.config.embedding_output_dimensions)
             ]
 
-    async def aembed(self, inputs: Iterable[Document]) -> Iterator[list[float]]:
-        return self.embed(inputs=inputs)
+    async def aembed(
+        self, inputs: Iterable[Document], **kwargs
+    ) -> AsyncIterator[list[float]]:
+        for embedding in self.embed(inputs=inputs, **kwargs):
+            yield embedding
@@ -1,9 +1,22 @@
-from collections.abc import Iterable, Iterator, Mapping, Sequence
+import asyncio
+import atexit
+import collections
+import contextlib
+import functools
+import hashlib
+import itertools
+import logging
+import time
+import types
+from collections.abc import AsyncIterator, Iterable, Iterator, Mapping, Sequence
 from dataclasses import dataclass
-from typing import Any, NotRequired, Self
+from typing import Any, NotRequired, Self, cast
 
+import httpx
 import litellm
 import litellm.types.utils
+from django.conf import settings
+from django.core.cache import BaseCache, caches
 from django.core.exceptions import ImproperlyConfigured
 
 from ..types import (
@@ -22,37 +35,211 @@ from .base import (
     BaseEmbeddingConfigSettingsDict,
 )
 
+DEFAULT_EMBEDDING_BATCH_SIZE = 96
+DEFAULT_EMBEDDING_CONCURRENCY = 4
+# Request parameters which change the embeddings returned for the same content, and
+# so are part of the cache key. Others, e.g. credentials and timeouts, are not.
+EMBEDDING_CACHE_PARAMETERS = ("dimensions", "encoding_format", "input_type")
+DEFAULT_HTTP_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+DEFAULT_CONNECTION_POOL: Mapping[str, Any] = {
+    "max_connections": 128,
+    "max_keepalive_connections": 64,
+    "keepalive_expiry": 5.0,
+}
+
+logger = logging.getLogger(__name__)
+
+# Pooled HTTP client shared by every LiteLLM backend in the process. Backends are
+# instantiated for each use, so the pool can't live on the backend instance.
+_http_client: httpx.Client | None = None
+_http_limits: httpx.Limits | None = None
+# Pool options which have already been warned about, so backends instantiated for
+# every request don't log the same warning each time.
+_ignored_http_limits: list[httpx.Limits] = []
+
 
 class BaseLiteLLMSettingsDict(BaseConfigSettingsDict):
     DEFAULT_PARAMETERS: NotRequired[Mapping[str, Any] | None]
+    CONNECTION_POOL: NotRequired[Mapping[str, Any] | None]
 
 
 class LiteLLMBackendSettingsDict(BaseLiteLLMSettingsDict, BaseChatConfigSettingsDict):
-    pass
+    STREAM_BATCH_TOKENS: NotRequired[int | None]
+    STREAM_BATCH_INTERVAL_MS: NotRequired[int | None]
 
 
 class LiteLLMEmbeddingSettingsDict(
     BaseLiteLLMSettingsDict, BaseEmbeddingConfigSettingsDict
 ):
-    pass
+    EMBEDDING_BATCH_SIZE: NotRequired[int | None]
+    EMBEDDING_CONCURRENCY: NotRequired[int | None]
+    EMBEDDING_CACHE: NotRequired[str | None]
+
+
+def _get_positive_int_setting(
+    config: Mapping[str, Any], setting_name: str, default: int | None
+) -> int | None:
+    value = config.get(setting_name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError as e:
+        raise ImproperlyConfigured(
+            f'"{setting_name}" is not an "int", it is a "{type(value)}".'
+        ) from e
+    if value < 1:
+        raise ImproperlyConfigured(
+            f'"{setting_name}" must be at least 1, it is {value}.'
+        )
+    return value
+
+
+def install_http_clients(connection_pool: Mapping[str, Any] | None = None) -> None:
+    """Install a pooled HTTP client as LiteLLM's synchronous client session, so
+    connections are kept alive and reused between requests rather than opened for
+    every call.
+
+    `connection_pool` overrides the `DEFAULT_CONNECTION_POOL` options used to create
+    the client. As LiteLLM only supports a single client session, every backend
+    shares the same pool, and options which differ from those of the existing pool
+    are ignored, with a warning logged the first time they're seen.
+
+    A client session which has already been configured on `litellm` elsewhere is
+    left as-is. Async requests are left to LiteLLM's own client cache, as an async
+    client's connections are bound to the event loop they were opened in.
+    """
+    global _http_client, _http_limits
+
+    limits = httpx.Limits(**{**DEFAULT_CONNECTION_POOL, **(connection_pool or {})})
+    if _http_client is not None and not _http_client.is_closed:
+        if limits != _http_limits and limits not in _ignored_http_limits:
+            _ignored_http_limits.append(limits)
+            logger.warning(
+                "The LiteLLM HTTP client is already open with %r; ignoring %r. Configure the same CONNECTION_POOL for every LiteLLM backend.",
+                _http_limits,
+                limits,
+            )
+        return
+
+    previous_client = _http_client
+    _http_client = httpx.Client(limits=limits, timeout=DEFAULT_HTTP_TIMEOUT)
+    _http_limits = limits
+    if litellm.client_session in (None, previous_client):
+        litellm.client_session = _http_client
+
+
+def close_http_clients() -> None:
+    """Close the shared HTTP client when shutting down. This is called automatically
+    when the process exits.
+
+    As the client is shared by every LiteLLM backend in the process, it is only closed
+    here, never by a backend. LiteLLM's cached provider clients hold on to it, so these
+    are flushed too, and the next backend to be instantiated installs a new client.
+    """
+    global _http_client, _http_limits
+
+    _ignored_http_limits.clear()
+    if _http_client is None:
+        return
+    if litellm.client_session is _http_client:
+        litellm.client_session = None
+    litellm.in_memory_llm_clients_cache.flush_cache()
+    _http_client.close()
+    _http_client = None
+    _http_limits = None
+
+
+atexit.register(close_http_clients)
+
+
+@functools.lru_cache(maxsize=256)
+def _get_model_info(model_id: str):
+    """Cached lookup of LiteLLM's model information, which is otherwise rebuilt on every call."""
+    return litellm.get_model_info(model=model_id)  # type: ignore
+
+
+def clear_model_info_cache() -> None:
+    _get_model_info.cache_clear()
+
+
+def _as_list(messages: Sequence[ChatMessage]) -> list[ChatMessage]:
+    """LiteLLM requires a list of messages; avoid copying one if we already have it."""
+    if isinstance(messages, list):
+        return messages
+    return list(messages)
+
+
+# Responses which should be wrapped in a LiteLLMStreamingAIResponse
+_STREAMING_RESPONSE_TYPES = (
+    litellm.CustomStreamWrapper,
+    types.GeneratorType,
+    types.AsyncGeneratorType,
+)
 
 
-def build_ai_response(response):
+def build_ai_response(
+    response,
+    *,
+    stream_batch_tokens: int = 1,
+    stream_batch_interval_ms: int | None = None,
+):
     """Convert a LiteLLM response to the appropriate AIResponse class"""
 
-    if type(response) == litellm.CustomStreamWrapper:
-        return LiteLLMStreamingAIResponse(response)
+    if isinstance(response, _STREAMING_RESPONSE_TYPES):
+        return LiteLLMStreamingAIResponse(
+            response,
+            batch_tokens=stream_batch_tokens,
+            batch_interval_ms=stream_batch_interval_ms,
+        )
 
-    return AIResponse(
-        choices=[choice["message"]["content"] for choice in response.choices]
-    )
+    return AIResponse(choices=[choice.message.content for choice in response.choices])
+
+
+# Returned in place of a part when no delta arrived before the batch interval elapsed
+_TIMED_OUT = object()
 
 
 class LiteLLMStreamingAIResponse(AIStreamingResponse):
-    """A wrapper around a litellm.CustomStreamWrapper to make it compatible with the AIStreamingResponse interface."""
+    """A wrapper around a litellm.CustomStreamWrapper to make it compatible with the AIStreamingResponse interface.
+
+    Consecutive deltas for the same choice are coalesced in to a single part, up to
+    `batch_tokens` deltas, or for at most `batch_interval_ms` after the first delta
+    of the part arrived.
+    """
+
+    __slots__ = (
+        "stream_wrapper",
+        "_next",
+        "_anext",
+        "batch_tokens",
+        "batch_interval",
+        "_held_part",
+        "_pending_next",
+        "_exhausted",
+    )
 
-    def __init__(self, stream_wrapper: litellm.CustomStreamWrapper) -> None:
+    def __init__(
+        self,
+        stream_wrapper: litellm.CustomStreamWrapper,
+        *,
+        batch_tokens: int = 1,
+        batch_interval_ms: int | None = None,
+    ) -> None:
         self.stream_wrapper = stream_wrapper
+        # Bound once here rather than looked up for every delta. A stream may only
+        # support one of sync or async iteration.
+        self._next = getattr(stream_wrapper, "__next__", None)
+        self._anext = getattr(stream_wrapper, "__anext__", None)
+        self.batch_tokens = batch_tokens
+        self.batch_interval = (
+            batch_interval_ms / 1000 if batch_interval_ms is not None else None
+        )
+        # A part for a different choice, read while building the previous part
+        self._held_part: AIResponseStreamingPart | None = None
+        # An in-progress read from the stream which outlived the batch interval
+        self._pending_next: asyncio.Future | None = None
+        self._exhausted = False
 
     def __iter__(self):
         return self
@@ -60,35 +247,140 @@ class LiteLLMStreamingAIResponse(AIStreamingResponse):
     def __aiter__(self):
         return self
 
-    def _build_chunk(self, response) -> AIResponseStreamingPart:
-        index = response.choices[0].index
-        choice = response.choices[0]
-        assert isinstance(choice, litellm.utils.StreamingChoices)  # type: ignore
-        content = choice.delta.content
+    def _build_chunk(self, response) -> AIResponseStreamingPart | None:
+        """Build a part from a streamed response, or return None if the delta has no
+        content (e.g. role-only, tool call or finish reason deltas)."""
+        # This runs for every delta, so the choice type is asserted to the type
+        # checker only, rather than with a runtime isinstance check
+        choice = cast(litellm.utils.StreamingChoices, response.choices[0])  # type: ignore
+        content = cast(str | None, choice.delta.content)
         if not content:
-            raise StopIteration
-        assert isinstance(content, str)
+            return None
 
         return {
-            "index": index,
+            "index": choice.index,
             "content": content,
         }
 
+    def _next_part(self) -> AIResponseStreamingPart | None:
+        """Read the next part with content from the stream, or None once it ends."""
+        if self._exhausted:
+            return None
+        while True:
+            try:
+                next_response = self._next()  # type: ignore
+            except StopIteration:
+                self._exhausted = True
+                return None
+            part = self._build_chunk(next_response)
+            if part is not None:
+                return part
+
+    async def _anext_part(self, deadline: float | None):
+        """Read the next part with content from the stream, None once it ends, or
+        _TIMED_OUT if nothing arrived before the deadline."""
+        while not self._exhausted:
+            if self._pending_next is None and deadline is None:
+                try:
+                    next_response = await self._anext()  # type: ignore
+                except StopAsyncIteration:
+                    self._exhausted = True
+                    break
+            else:
+                if self._pending_next is None:
+                    self._pending_next = asyncio.ensure_future(self._anext())  # type: ignore
+                timeout = (
+                    None if deadline is None else max(deadline - time.monotonic(), 0)
+                )
+                done, _ = await asyncio.wait({self._pending_next}, timeout=timeout)
+                if not done:
+                    return _TIMED_OUT
+                pending_next, self._pending_next = self._pending_next, None
+                try:
+                    next_response = pending_next.result()
+                except StopAsyncIteration:
+                    self._exhausted = True
+                    break
+
+            part = self._build_chunk(next_response)
+            if part is not None:
+                return part
+        return None
+
+    def _take_held_part(self) -> AIResponseStreamingPart | None:
+        part, self._held_part = self._held_part, None
+        return part
+
+    def _add_part(
+        self, parts: list[AIResponseStreamingPart], part: AIResponseStreamingPart
+    ) -> bool:
+        """Add a part to the batch, returning False if it belongs to a different
+        choice and has been held back for the next batch instead."""
+        if parts and part["index"] != parts[0]["index"]:
+            self._held_part = part
+            return False
+        parts.append(part)
+        return True
+
+    @staticmethod
+    def _join_parts(parts: list[AIResponseStreamingPart]) -> AIResponseStreamingPart:
+        if len(parts) == 1:
+            return parts[0]
+        return {
+            "index": parts[0]["index"],
+            "content": "".join(part["content"] for part in parts),
+        }
+
     def __next__(self) -> AIResponseStreamingPart:
-        next_response = next(self.stream_wrapper)
-        return self._build_chunk(next_response)
+        parts: list[AIResponseStreamingPart] = []
+        deadline = None
+        while len(parts) < self.batch_tokens:
+            part = self._take_held_part() or self._next_part()
+            if part is None or not self._add_part(parts, part):
+                break
+            if self.batch_interval is not None:
+                # Blocking reads can't be interrupted, so the interval is only
+                # checked as each delta arrives
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.batch_interval
+                elif now >= deadline:
+                    break
+        if not parts:
+            raise StopIteration
+        return self._join_parts(parts)
 
     async def __anext__(self):
-        next_response = await self.stream_wrapper.__anext__()
-        try:
-            return self._build_chunk(next_response)
-        except StopIteration as e:
-            raise StopAsyncIteration from e
+        parts: list[AIResponseStreamingPart] = []
+        deadline = None
+        while len(parts) < self.batch_tokens:
+            part = self._take_held_part() or await self._anext_part(deadline)
+            if part is None or part is _TIMED_OUT or not self._add_part(parts, part):
+                break
+            if self.batch_interval is not None and deadline is None:
+                deadline = time.monotonic() + self.batch_interval
+        if not parts:
+            raise StopAsyncIteration
+        return self._join_parts(parts)
+
+    async def aclose(self) -> None:
+        """Cancel any read left running by the batch interval and close the stream,
+        so an abandoned response doesn't leave its request open."""
+        self._exhausted = True
+        if self._pending_next is not None:
+            pending_next, self._pending_next = self._pending_next, None
+            pending_next.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                await pending_next
+        aclose = getattr(self.stream_wrapper, "aclose", None)
+        if aclose is not None:
+            await aclose()
 
 
 @dataclass(kw_only=True)
 class LiteLLMBackendConfigMixin:
     default_parameters: Mapping[str, Any]
+    connection_pool: Mapping[str, Any]
 
     @classmethod
     def from_settings(cls, config: BaseLiteLLMSettingsDict, **kwargs: Any) -> Self:
@@ -97,12 +389,32 @@ class LiteLLMBackendConfigMixin:
             default_parameters = {}
         kwargs.setdefault("default_parameters", default_parameters)
 
+        connection_pool = config.get("CONNECTION_POOL")
+        if connection_pool is None:
+            connection_pool = {}
+        unknown_options = set(connection_pool) - set(DEFAULT_CONNECTION_POOL)
+        if unknown_options:
+            raise ImproperlyConfigured(
+                f'"CONNECTION_POOL" contains unknown options: {", ".join(sorted(unknown_options))}.'
+            )
+        kwargs.setdefault("connection_pool", connection_pool)
+
         return super().from_settings(config, **kwargs)  # type: ignore
 
+    def with_default_parameters(self, parameters: dict[str, Any]) -> dict[str, Any]:
+        """Merge parameters passed to a call over the configured default parameters.
+
+        Parameters passed to the call take precedence. When there are no default
+        parameters, the passed parameters are returned as-is, without a copy.
+        """
+        if not self.default_parameters:
+            return parameters
+        return {**self.default_parameters, **parameters}
+
     @classmethod
     def _get_token_limit(cls, *, model_id: str) -> int:
         """Backend-specific method for retrieving the token limit for the provided model."""
-        model_info = litellm.get_model_info(model=model_id)  # type: ignore
+        model_info = _get_model_info(model_id)
         if (
             not model_info
             or "max_input_tokens" not in model_info
@@ -118,16 +430,59 @@ class LiteLLMBackendConfigMixin:
 class LiteLLMChatBackendConfig(
     LiteLLMBackendConfigMixin, BaseChatConfig[LiteLLMBackendSettingsDict]
 ):
-    pass
+    stream_batch_tokens: int
+    stream_batch_interval_ms: int | None
+
+    @classmethod
+    def from_settings(cls, config: LiteLLMBackendSettingsDict, **kwargs: Any) -> Self:
+        kwargs.setdefault(
+            "stream_batch_tokens",
+            _get_positive_int_setting(config, "STREAM_BATCH_TOKENS", 1),
+        )
+        kwargs.setdefault(
+            "stream_batch_interval_ms",
+            _get_positive_int_setting(config, "STREAM_BATCH_INTERVAL_MS", None),
+        )
+
+        return super().from_settings(config, **kwargs)
 
 
 @dataclass(kw_only=True)
 class LiteLLMEmbeddingBackendConfig(
     LiteLLMBackendConfigMixin, BaseEmbeddingConfig[LiteLLMEmbeddingSettingsDict]
 ):
+    embedding_batch_size: int
+    embedding_concurrency: int
+    embedding_cache_alias: str | None
+
+    @classmethod
+    def from_settings(cls, config: LiteLLMEmbeddingSettingsDict, **kwargs: Any) -> Self:
+        kwargs.setdefault(
+            "embedding_batch_size",
+            _get_positive_int_setting(
+                config, "EMBEDDING_BATCH_SIZE", DEFAULT_EMBEDDING_BATCH_SIZE
+            ),
+        )
+        kwargs.setdefault(
+            "embedding_concurrency",
+            _get_positive_int_setting(
+                config, "EMBEDDING_CONCURRENCY", DEFAULT_EMBEDDING_CONCURRENCY
+            ),
+        )
+        embedding_cache_alias = config.get("EMBEDDING_CACHE")
+        if embedding_cache_alias is not None and embedding_cache_alias not in getattr(
+            settings, "CACHES", {}
+        ):
+            raise ImproperlyConfigured(
+                f'"EMBEDDING_CACHE" is set to "{embedding_cache_alias}", but there is no cache with that alias in "CACHES".'
+            )
+        kwargs.setdefault("embedding_cache_alias", embedding_cache_alias)
+
+        return super().from_settings(config, **kwargs)
+
     @classmethod
     def _get_embedding_output_dimensions(cls, *, model_id: str) -> int:
-        model_info = litellm.get_model_info(model=model_id)  # type: ignore
+        model_info = _get_model_info(model_id)
         if (
             not model_info
             or "output_vector_size" not in model_info
@@ -139,48 +494,202 @@ class LiteLLMEmbeddingBackendConfig(
         return model_info["output_vector_size"]
 
 
-class LiteLLMChatBackend(BaseChatBackend[LiteLLMChatBackendConfig]):
+class LiteLLMHTTPClientMixin:
+    """Ensures LiteLLM uses the shared, pooled HTTP client."""
+
+    config: LiteLLMBackendConfigMixin
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        install_http_clients(self.config.connection_pool)
+
+
+class LiteLLMChatBackend(
+    LiteLLMHTTPClientMixin, BaseChatBackend[LiteLLMChatBackendConfig]
+):
     config: LiteLLMChatBackendConfig
     config_cls = LiteLLMChatBackendConfig
 
     def chat(
         self, *, messages: Sequence[ChatMessage], stream: bool = False, **kwargs
     ) -> AIResponse | AIStreamingResponse:
-        parameters = {**self.config.default_parameters, **kwargs}
         response = litellm.completion(
             model=self.config.model_id,
-            messages=list(messages),
+            messages=_as_list(messages),
             stream=stream,
-            **parameters,
+            **self.config.with_default_parameters(kwargs),
+        )
+        return build_ai_response(
+            response,
+            stream_batch_tokens=self.config.stream_batch_tokens,
+            stream_batch_interval_ms=self.config.stream_batch_interval_ms,
         )
-        return build_ai_response(response)
 
     async def achat(
         self, *, messages: Sequence[ChatMessage], stream: bool = False, **kwargs
     ) -> AIResponse | AIStreamingResponse:
-        parameters = {**self.config.default_parameters, **kwargs}
         response = await litellm.acompletion(
             model=self.config.model_id,
-            messages=list(messages),
+            messages=_as_list(messages),
             stream=stream,
-            **parameters,
+            **self.config.with_default_parameters(kwargs),
+        )
+        return build_ai_response(
+            response,
+            stream_batch_tokens=self.config.stream_batch_tokens,
+            stream_batch_interval_ms=self.config.stream_batch_interval_ms,
         )
-        return build_ai_response(response)
 
 
-class LiteLLMEmbeddingBackend(BaseEmbeddingBackend[LiteLLMEmbeddingBackendConfig]):
+class LiteLLMEmbeddingBackend(
+    LiteLLMHTTPClientMixin, BaseEmbeddingBackend[LiteLLMEmbeddingBackendConfig]
+):
     config: LiteLLMEmbeddingBackendConfig
     config_cls = LiteLLMEmbeddingBackendConfig
 
-    def embed(self, inputs: Iterable[str], **kwargs) -> Iterator[list[float]]:
-        response = litellm.embedding(model=self.config.model_id, input=inputs, **kwargs)
-        # LiteLLM *should* return an EmbeddingResponse
-        assert isinstance(response, litellm.types.utils.EmbeddingResponse)
-        yield from [data["embedding"] for data in response["data"]]
-
-    async def aembed(self, inputs: Iterable[str], **kwargs) -> Iterator[list[float]]:
-        response = await litellm.aembedding(
-            model=self.config.model_id, input=inputs, **kwargs
+    def _batch_inputs(self, inputs: Iterable[str]) -> Iterator[list[str]]:
+        """Split inputs in to lists of at most `embedding_batch_size` items so that
+        large inputs are sent to the provider over several bounded requests."""
+        iterator = iter(inputs)
+        while batch := list(
+            itertools.islice(iterator, self.config.embedding_batch_size)
+        ):
+            yield batch
+
+    @property
+    def cache(self) -> BaseCache | None:
+        """The Django cache that embeddings are stored in, if `EMBEDDING_CACHE` is configured."""
+        if self.config.embedding_cache_alias is None:
+            return None
+        return caches[self.config.embedding_cache_alias]
+
+    def _cache_parameters(self, kwargs: Mapping[str, Any]) -> str:
+        """Describe everything other than the content which affects the embeddings
+        returned, so requests for e.g. different `dimensions` are cached separately."""
+        return repr(
+            (
+                self.config.model_id,
+                self.config.embedding_output_dimensions,
+                [
+                    (name, kwargs[name])
+                    for name in EMBEDDING_CACHE_PARAMETERS
+                    if name in kwargs
+                ],
+            )
+        )
+
+    def _cache_key(self, text: str, parameters: str) -> str:
+        """Build a cache key addressed by the request parameters and the content
+        being embedded, so unchanged content is never re-embedded by the same model."""
+        digest = hashlib.blake2b(
+            f"{parameters}\0{text}".encode(), digest_size=16
+        ).hexdigest()
+        return f"wagtail_vector_index:embedding:{digest}"
+
+    def _request_embeddings(self, batch: list[str], **kwargs) -> Iterator[list[float]]:
+        # LiteLLM always returns an EmbeddingResponse, so this is only asserted to
+        # the type checker rather than checked at runtime
+        response = cast(
+            litellm.types.utils.EmbeddingResponse,
+            litellm.embedding(model=self.config.model_id, input=batch, **kwargs),
         )
+        for data in response["data"]:
+            yield data["embedding"]
+
+    async def _arequest_embeddings(
+        self, batch: list[str], **kwargs
+    ) -> Iterator[list[float]]:
+        response = cast(
+            litellm.types.utils.EmbeddingResponse,
+            await litellm.aembedding(model=self.config.model_id, input=batch, **kwargs),
+        )
+        return (data["embedding"] for data in response["data"])
+
+    @staticmethod
+    def _cache_misses(
+        keys: list[str], batch: list[str], cached: Mapping[str, list[float]]
+    ) -> dict[str, str]:
+        """Return the distinct inputs in the batch, keyed by cache key, which aren't
+        in `cached`."""
+        return {
+            key: text
+            for key, text in zip(keys, batch, strict=True)
+            if key not in cached
+        }
 
-        return iter([data["embedding"] for data in response["data"]])
+    @staticmethod
+    def _computed_embeddings(
+        keys: Iterable[str], embeddings: Iterable[list[float]]
+    ) -> dict[str, list[float]]:
+        """Pair newly computed embeddings with their cache keys, raising before
+        anything is cached if the provider returned the wrong number of them."""
+        keys, embeddings = list(keys), list(embeddings)
+        if len(embeddings) != len(keys):
+            raise ValueError(
+                f"Expected {len(keys)} embeddings from LiteLLM, got {len(embeddings)}."
+            )
+        return dict(zip(keys, embeddings, strict=True))
+
+    def _embed_batch(self, batch: list[str], **kwargs) -> Iterator[list[float]]:
+        cache = self.cache
+        if cache is None:
+            yield from self._request_embeddings(batch, **kwargs)
+            return
+
+        parameters = self._cache_parameters(kwargs)
+        keys = [self._cache_key(text, parameters) for text in batch]
+        cached = cache.get_many(keys)
+        misses = self._cache_misses(keys, batch, cached)
+        if misses:
+            computed = self._computed_embeddings(
+                misses.keys(),
+                self._request_embeddings(list(misses.values()), **kwargs),
+            )
+            cache.set_many(computed)
+            cached.update(computed)
+        for key in keys:
+            yield cached[key]
+
+    async def _aembed_batch(self, batch: list[str], **kwargs) -> Iterable[list[float]]:
+        cache = self.cache
+        if cache is None:
+            return await self._arequest_embeddings(batch, **kwargs)
+
+        parameters = self._cache_parameters(kwargs)
+        keys = [self._cache_key(text, parameters) for text in batch]
+        cached = await cache.aget_many(keys)
+        misses = self._cache_misses(keys, batch, cached)
+        if misses:
+            computed = self._computed_embeddings(
+                misses.keys(),
+                await self._arequest_embeddings(list(misses.values()), **kwargs),
+            )
+            await cache.aset_many(computed)
+            cached.update(computed)
+        return (cached[key] for key in keys)
+
+    def embed(self, inputs: Iterable[str], **kwargs) -> Iterator[list[float]]:
+        kwargs = self.config.with_default_parameters(kwargs)
+        for batch in self._batch_inputs(inputs):
+            yield from self._embed_batch(batch, **kwargs)
+
+    async def aembed(
+        self, inputs: Iterable[str], **kwargs
+    ) -> AsyncIterator[list[float]]:
+        """Embed batches concurrently, keeping up to `embedding_concurrency` requests
+        in flight, while still yielding embeddings in the same order as the inputs."""
+        kwargs = self.config.with_default_parameters(kwargs)
+        pending: collections.deque[asyncio.Task] = collections.deque()
+        try:
+            for batch in self._batch_inputs(inputs):
+                if len(pending) >= self.config.embedding_concurrency:
+                    for embedding in await pending.popleft():
+                        yield embedding
+                pending.append(asyncio.create_task(self._aembed_batch(batch, **kwargs)))
+            while pending:
+                for embedding in await pending.popleft():
+                    yield embedding
+        finally:
+            # Don't leave requests running if the consumer stops early or fails
+            for task in pending:
+                task.cancel()
@@ -37,6 +37,9 @@ class AIStreamingResponse:
     ]
     """
 
+    # Allow subclasses to use __slots__, as a response is created for every streamed request
+    __slots__ = ()
+
     def __iter__(self):
         return self
 
@@ -47,6 +50,9 @@ class AIStreamingResponse:
 
     async def __anext__(self) -> AIResponseStreamingPart: ...
 
+    async def aclose(self) -> None:
+        """Release any resources held by the response if it isn't read to the end."""
+
 
 class AIResponse:
     """Representation of a non-streaming response from an AI backend.
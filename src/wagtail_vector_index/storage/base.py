@@ -239,8 +239,8 @@ class VectorIndex(Generic[ConfigClass]):
         Replicates the features of `VectorIndex.query()`, but in an async way.
         """
         try:
-            query_embedding = next(await self.get_embedding_backend().aembed([query]))
-        except IndexError as e:
+            query_embedding = await anext(self.get_embedding_backend().aembed([query]))
+        except StopAsyncIteration as e:
             raise ValueError("No embeddings were generated for the given query.") from e
 
         similar_documents = [
@@ -267,8 +267,11 @@ class VectorIndex(Generic[ConfigClass]):
         response = await chat_backend.achat(messages=messages, stream=True)
 
         async def async_stream_wrapper():
-            async for chunk in response:
-                yield chunk["content"]
+            try:
+                async for chunk in response:
+                    yield chunk["content"]
+            finally:
+                await response.aclose()
 
         return AsyncQueryResponse(
             response=async_stream_wrapper(),
@@ -7,6 +7,7 @@ from collections.abc import (
     MutableSequence,
     Sequence,
 )
+from functools import cache
 from itertools import chain, islice
 from typing import (
     TYPE_CHECKING,
@@ -95,6 +96,29 @@ class ModelKey(str):
         return self.split(":")[1]
 
 
+@cache
+def _get_parent_model_labels(model_class: type[models.Model]) -> tuple[ModelLabel, ...]:
+    """Get the labels of all the concrete parents of a model class in MRO order.
+
+    Django rebuilds the parent list on every call, but it can't change for a given
+    model class, so the result is cached.
+    """
+    # For the common single-inheritance chain (e.g. Page subclasses) walk up the
+    # parents directly, rather than having Django build and merge a parent list at
+    # every level.
+    parents = []
+    current = model_class
+    while len(current._meta.parents) == 1:
+        current = next(iter(current._meta.parents))
+        parents.append(current)
+
+    if current._meta.parents:
+        # Multi-table multiple inheritance; defer to Django so ordering is unchanged
+        parents = model_class._meta.get_parent_list()
+
+    return tuple(parent._meta.label for parent in parents)
+
+
 # ###########
 # Classes that allow users to automatically generate documents from their models based on fields specified
 # ###########
@@ -112,16 +136,26 @@ class EmbeddableFieldsMixin(models.Model):
     """Mixin for Django models that allows the user to specify which fields should be used to generate embeddings."""
 
     embedding_fields = []
+    _embedding_fields_cache: ClassVar[tuple[list, tuple["EmbeddingField", ...]]]
 
     class Meta:
         abstract = True
 
     @classmethod
-    def _get_embedding_fields(cls) -> list["EmbeddingField"]:
-        embedding_fields = {
-            (type(field), field.field_name): field for field in cls.embedding_fields
-        }
-        return list(embedding_fields.values())
+    def _get_embedding_fields(cls) -> Sequence["EmbeddingField"]:
+        """Get the model's embedding fields, with duplicates of the same type and name removed.
+
+        This is called for every object being chunked, so the result is cached on the
+        model class until `embedding_fields` is reassigned.
+        """
+        cached = cls.__dict__.get("_embedding_fields_cache")
+        if cached is None or cached[0] is not cls.embedding_fields:
+            embedding_fields = {
+                (type(field), field.field_name): field for field in cls.embedding_fields
+            }
+            cached = (cls.embedding_fields, tuple(embedding_fields.values()))
+            cls._embedding_fields_cache = cached
+        return cached[1]
 
     @classmethod
     def check(cls, **kwargs):
@@ -279,8 +313,10 @@ class ModelToDocumentOperator(ToDocumentOperator[models.Model]):
     @staticmethod
     def _keys_for_instance(instance: models.Model) -> list[ModelKey]:
         """Get keys for all the parent classes and the object itself in MRO order"""
-        parent_classes = instance._meta.get_parent_list()
-        keys = [ModelKey(f"{cls._meta.label}:{instance.pk}") for cls in parent_classes]
+        keys = [
+            ModelKey(f"{label}:{instance.pk}")
+            for label in _get_parent_model_labels(instance._meta.model)
+        ]
         keys = [ModelKey.from_instance(instance), *keys]
         return keys
 
@@ -352,7 +388,7 @@ class ModelToDocumentOperator(ToDocumentOperator[models.Model]):
             chain(*[obj["chunks"] for obj in objects_to_rebuild.values()])
         )
 
-        embedding_vectors = list(embedding_backend.embed(all_chunks))
+        embedding_vectors = embedding_backend.embed(all_chunks)
         documents_by_object = defaultdict(list)
 
         for idx, embedding in enumerate(embedding_vectors):
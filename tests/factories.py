@@ -1,3 +1,5 @@
+import random
+
 import factory
 import wagtail_factories
 from faker import Faker
@@ -6,6 +8,9 @@ from wagtail_vector_index.storage.models import Document
 
 fake = Faker()
 
+# A seeded generator is far cheaper than calling Faker for each vector component
+_rng = random.Random(0)
+
 
 class ExampleModelFactory(factory.django.DjangoModelFactory):
     title = factory.Faker("sentence")
@@ -34,6 +39,6 @@ class DocumentFactory(factory.django.DjangoModelFactory):
     class Meta:
         model = Document
 
-    vector = factory.LazyFunction(lambda: [fake.pyfloat() for _ in range(300)])
+    vector = factory.LazyFunction(lambda: [_rng.random() for _ in range(300)])
     content = factory.LazyFunction(lambda: "\n".join(fake.paragraphs()))
     object_keys = factory.Iterator([fake.uuid4() for _ in range(3)])
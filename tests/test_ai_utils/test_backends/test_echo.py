@@ -226,3 +226,25 @@ def test_embed():
 
     # We should get as many embeddings as we have items in the list.
     assert counter == 4
+
+
+async def test_aembed_accepts_parameters():
+    backend = get_embedding_backend(
+        backend_dict={
+            "CLASS": "wagtail_vector_index.ai_utils.backends.echo.EchoEmbeddingBackend",
+            "CONFIG": {
+                "MODEL_ID": "echo",
+                "TOKEN_LIMIT": 1024,
+                "EMBEDDING_OUTPUT_DIMENSIONS": 10,
+            },
+        },
+        backend_id="default",
+    )
+    embeddings = [
+        embedding
+        async for embedding in backend.aembed(
+            ["Little trotty wagtail he went in the rain,"], dimensions=10
+        )
+    ]
+    assert len(embeddings) == 1
+    assert len(embeddings[0]) == 10
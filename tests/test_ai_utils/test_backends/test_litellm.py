@@ -1,14 +1,26 @@
+import asyncio
+import json
+import math
 import re
-from typing import List
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List
 from unittest.mock import AsyncMock
 
+import httpx
 import pytest
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
 from wagtail_vector_index.ai_utils.backends import (
     InvalidAIBackendError,
     get_chat_backend,
     get_embedding_backend,
 )
-from wagtail_vector_index.ai_utils.backends.litellm import LiteLLMEmbeddingBackend
+from wagtail_vector_index.ai_utils.backends.litellm import (
+    LiteLLMEmbeddingBackend,
+    build_ai_response,
+    clear_model_info_cache,
+)
 from wagtail_vector_index.ai_utils.types import ChatMessage
 
 try:
@@ -36,20 +48,26 @@ def litellm_chat_backend_class():
 
 @pytest.fixture
 def litellm_embedding_backend_class():
-    from wagtail_vector_index.ai_utils.backends.litellm import LiteLLMEmbeddingBackend
+    from wagtail_vector_index.ai_utils.backends.litellm import (
+        LiteLLMEmbeddingBackend,
+    )
 
     return LiteLLMEmbeddingBackend
 
 
 @pytest.fixture
 def make_chat_backend():
-    def _make_chat_backend(default_parameters: dict[str, str] | None = None):
+    def _make_chat_backend(
+        default_parameters: dict[str, str] | None = None,
+        extra_config: dict[str, Any] | None = None,
+    ):
         return get_chat_backend(
             backend_dict={
                 "CLASS": "wagtail_vector_index.ai_utils.backends.litellm.LiteLLMChatBackend",
                 "CONFIG": {
                     "MODEL_ID": "gpt-3.5-turbo",
                     "DEFAULT_PARAMETERS": default_parameters or {},  # type: ignore
+                    **(extra_config or {}),
                 },
             },
             backend_id="default",
@@ -62,6 +80,7 @@ def make_chat_backend():
 def make_embedding_backend():
     def _make_embedding_backend(
         default_parameters: dict[str, str] | None = None,
+        extra_config: dict[str, Any] | None = None,
     ) -> LiteLLMEmbeddingBackend:
         return get_embedding_backend(
             backend_dict={
@@ -69,6 +88,7 @@ def make_embedding_backend():
                 "CONFIG": {
                     "MODEL_ID": "text-embedding-ada-002",
                     "DEFAULT_PARAMETERS": default_parameters or {},  # type: ignore
+                    **(extra_config or {}),
                 },
             },
             backend_id="default",
@@ -77,6 +97,20 @@ def make_embedding_backend():
     return _make_embedding_backend
 
 
+@pytest.fixture(autouse=True)
+def reset_litellm_http_clients():
+    """Don't let HTTP clients installed by backends in one test leak in to others."""
+    if not litellm_installed:
+        yield
+        return
+
+    from wagtail_vector_index.ai_utils.backends.litellm import close_http_clients
+
+    close_http_clients()
+    yield
+    close_http_clients()
+
+
 ###############################################################################
 # Chat
 ###############################################################################
@@ -144,6 +178,19 @@ def test_litellm_custom_chat_default_parameters_overridable(make_chat_backend, m
     )
 
 
+@if_litellm_installed
+def test_litellm_chat_accepts_message_tuple(make_chat_backend, mocker):
+    backend = make_chat_backend()
+    prompt_mock = mocker.patch(
+        "wagtail_vector_index.ai_utils.backends.litellm.litellm.completion"
+    )
+    message: ChatMessage = {"content": "Little trotty wagtail", "role": "user"}
+    backend.chat(messages=(message,))
+    prompt_mock.assert_called_once_with(
+        messages=[message], model="gpt-3.5-turbo", stream=False
+    )
+
+
 @if_litellm_installed
 def test_litellm_chat(make_chat_backend):
     backend = make_chat_backend()
@@ -203,6 +250,225 @@ async def test_litellm_streaming_async_chat(make_chat_backend):
     assert full_text == response_text
 
 
+@if_litellm_installed
+def test_litellm_streaming_chat_coalesces_deltas(make_chat_backend):
+    input_text = "Little trotty wagtail, he waddled in the mud."
+    response_text = "And left his little footmarks, trample where he would."
+    messages: List[ChatMessage] = [{"content": input_text, "role": "user"}]
+    unbatched_chunks = list(
+        make_chat_backend().chat(
+            messages=messages, stream=True, mock_response=response_text
+        )
+    )
+
+    backend = make_chat_backend(extra_config={"STREAM_BATCH_TOKENS": 4})
+    chunks = list(
+        backend.chat(messages=messages, stream=True, mock_response=response_text)
+    )
+
+    assert "".join(chunk["content"] for chunk in chunks) == response_text
+    assert len(chunks) == math.ceil(len(unbatched_chunks) / 4)
+
+
+@if_litellm_installed
+async def test_litellm_streaming_async_chat_coalesces_deltas(make_chat_backend):
+    input_text = "Little trotty wagtail, he waddled in the mud."
+    response_text = "And left his little footmarks, trample where he would."
+    messages: List[ChatMessage] = [{"content": input_text, "role": "user"}]
+    backend = make_chat_backend(
+        extra_config={"STREAM_BATCH_TOKENS": 4, "STREAM_BATCH_INTERVAL_MS": 1000}
+    )
+    response = await backend.achat(
+        messages=messages, stream=True, mock_response=response_text
+    )
+
+    full_text = ""
+    async for chunk in response:
+        full_text += chunk["content"]
+
+    assert full_text == response_text
+
+
+@if_litellm_installed
+def test_litellm_backends_share_pooled_http_clients(
+    make_chat_backend, make_embedding_backend
+):
+    make_chat_backend()
+    client_session = litellm.client_session
+    assert client_session is not None
+
+    make_embedding_backend()
+    assert litellm.client_session is client_session
+
+
+@if_litellm_installed
+def test_litellm_backend_leaves_async_client_session_alone(make_chat_backend):
+    # Async clients are bound to an event loop, so these are left to LiteLLM
+    aclient_session = litellm.aclient_session
+    make_chat_backend()
+    assert litellm.aclient_session is aclient_session
+
+
+@pytest.fixture
+def fake_openai_server():
+    """Serve chat completions locally, returning the base URL and a list of the
+    paths requested."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            requests.append(self.path)
+            body = json.dumps(
+                {
+                    "id": "chatcmpl-test",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": "gpt-3.5-turbo",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "Hello"},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                }
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/v1", requests
+    server.shutdown()
+    server.server_close()
+
+
+@if_litellm_installed
+def test_litellm_backend_requests_after_http_client_closed(
+    make_chat_backend, fake_openai_server
+):
+    from wagtail_vector_index.ai_utils.backends.litellm import close_http_clients
+
+    api_base, requests = fake_openai_server
+    messages: List[ChatMessage] = [{"content": "Hello", "role": "user"}]
+    parameters = {"api_base": api_base, "api_key": "test"}
+
+    response = make_chat_backend(default_parameters=parameters).chat(messages=messages)
+    assert response.choices == ["Hello"]
+
+    close_http_clients()
+    response = make_chat_backend(default_parameters=parameters).chat(messages=messages)
+    assert response.choices == ["Hello"]
+    assert requests == ["/v1/chat/completions"] * 2
+
+
+def _streaming_response(content: str | None):
+    return litellm.ModelResponseStream(
+        choices=[{"index": 0, "delta": {"content": content}}]
+    )
+
+
+@if_litellm_installed
+def test_litellm_streaming_response_skips_empty_deltas():
+    stream = (
+        _streaming_response(content)
+        for content in [None, "Little ", "", "trotty wagtail", None]
+    )
+    response = build_ai_response(stream)
+    assert [chunk["content"] for chunk in response] == ["Little ", "trotty wagtail"]
+
+
+@if_litellm_installed
+async def test_litellm_async_streaming_response_skips_empty_deltas():
+    async def stream():
+        for content in [None, "Little ", "", "trotty wagtail", None]:
+            yield _streaming_response(content)
+
+    response = build_ai_response(stream())
+    assert [chunk["content"] async for chunk in response] == [
+        "Little ",
+        "trotty wagtail",
+    ]
+
+
+@if_litellm_installed
+async def test_litellm_async_streaming_response_flushes_on_interval_and_closes():
+    closed = False
+
+    async def stream():
+        nonlocal closed
+        try:
+            for content in ["Little ", "trotty wagtail"]:
+                yield _streaming_response(content)
+            # The provider stalls, so the batch is sent after the interval
+            await asyncio.sleep(10)
+            yield _streaming_response(", he waddled in the mud.")
+        finally:
+            closed = True
+
+    response = build_ai_response(
+        stream(), stream_batch_tokens=8, stream_batch_interval_ms=20
+    )
+    part = await asyncio.wait_for(response.__anext__(), timeout=1)
+    assert part == {"index": 0, "content": "Little trotty wagtail"}
+    assert not closed
+
+    await response.aclose()
+    assert closed
+    with pytest.raises(StopAsyncIteration):
+        await response.__anext__()
+
+
+@if_litellm_installed
+def test_litellm_connection_pool_options(make_chat_backend, mocker):
+    client_class = mocker.patch(
+        "wagtail_vector_index.ai_utils.backends.litellm.httpx.Client",
+        wraps=httpx.Client,
+    )
+    make_chat_backend(
+        extra_config={
+            "CONNECTION_POOL": {"max_connections": 256, "keepalive_expiry": 30.0}
+        }
+    )
+    client_class.assert_called_once()
+    assert client_class.call_args.kwargs["limits"] == httpx.Limits(
+        max_connections=256, max_keepalive_connections=64, keepalive_expiry=30.0
+    )
+
+
+@if_litellm_installed
+def test_litellm_connection_pool_mismatch_warns_once(make_chat_backend, mocker, caplog):
+    client_class = mocker.patch(
+        "wagtail_vector_index.ai_utils.backends.litellm.httpx.Client",
+        wraps=httpx.Client,
+    )
+    make_chat_backend()
+    client_session = litellm.client_session
+
+    for _ in range(3):
+        make_chat_backend(extra_config={"CONNECTION_POOL": {"max_connections": 256}})
+
+    assert litellm.client_session is client_session
+    client_class.assert_called_once()
+    assert client_class.call_args.kwargs["limits"] == httpx.Limits(
+        max_connections=128, max_keepalive_connections=64, keepalive_expiry=5.0
+    )
+    assert caplog.text.count("ignoring") == 1
+
+
+@if_litellm_installed
+def test_litellm_connection_pool_unknown_option(make_chat_backend):
+    with pytest.raises(ImproperlyConfigured, match="CONNECTION_POOL"):
+        make_chat_backend(extra_config={"CONNECTION_POOL": {"max_sockets": 16}})
+
+
 ###############################################################################
 # Embeddings
 ###############################################################################
@@ -237,6 +503,16 @@ def test_litellm_custom_embedding_default_parameters(make_embedding_backend):
     assert backend.config.default_parameters == {"api_key": "random-api-key"}
 
 
+@if_litellm_installed
+def test_litellm_model_info_is_cached(make_embedding_backend, mocker):
+    clear_model_info_cache()
+    get_model_info_spy = mocker.spy(litellm, "get_model_info")
+    make_embedding_backend()
+    make_embedding_backend()
+    get_model_info_spy.assert_called_once_with(model="text-embedding-ada-002")
+    clear_model_info_cache()
+
+
 @if_litellm_installed
 def test_litellm_embed(make_embedding_backend, mocker):
     backend = make_embedding_backend()
@@ -275,5 +551,238 @@ async def test_litellm_aembed(make_embedding_backend, mocker):
         "He waddled in the water-pudge, and waggle went his tail,",
         "And chirrupt up his wings to dry upon the garden rail.",
     ]
-    list(await backend.aembed(input_text))
+    [embedding async for embedding in backend.aembed(input_text)]
     embed_mock.assert_called_once_with(input=input_text, model=backend.config.model_id)
+
+
+@if_litellm_installed
+def test_litellm_embed_default_parameters_overridable(make_embedding_backend, mocker):
+    backend = make_embedding_backend(
+        default_parameters={"api_key": "random-api-key", "user": "wagtail"}
+    )
+    embed_mock = mocker.patch(
+        "wagtail_vector_index.ai_utils.backends.litellm.litellm.embedding",
+        return_value=litellm.EmbeddingResponse(data=[{"embedding": [1.0, 2.0, 3.0]}]),
+    )
+    list(backend.embed(["Little trotty wagtail"], api_key="other-api-key"))
+    embed_mock.assert_called_once_with(
+        input=["Little trotty wagtail"],
+        model=backend.config.model_id,
+        api_key="other-api-key",
+        user="wagtail",
+    )
+
+
+@if_litellm_installed
+def test_litellm_embed_batches_inputs(make_embedding_backend, mocker):
+    backend = make_embedding_backend(extra_config={"EMBEDDING_BATCH_SIZE": 2})
+    fake_embedding_response = litellm.EmbeddingResponse(
+        data=[
+            {"embedding": [1.0, 2.0, 3.0]},
+            {"embedding": [4.0, 5.0, 6.0]},
+        ]
+    )
+    embed_mock = mocker.patch(
+        "wagtail_vector_index.ai_utils.backends.litellm.litellm.embedding",
+        return_value=fake_embedding_response,
+    )
+    input_text = [
+        "Little trotty wagtail, he waddled in the mud,",
+        "And left his little footmarks, trample where he would.",
+        "He waddled in the water-pudge, and waggle went his tail,",
+        "And chirrupt up his wings to dry upon the garden rail.",
+    ]
+    embeddings = list(backend.embed(input_text))
+    assert len(embeddings) == 4
+    assert embed_mock.call_args_list == [
+        mocker.call(input=input_text[:2], model=backend.config.model_id),
+        mocker.call(input=input_text[2:], model=backend.config.model_id),
+    ]
+
+
+@if_litellm_installed
+def test_litellm_embedding_batch_size_must_be_positive(make_embedding_backend):
+    with pytest.raises(ImproperlyConfigured, match="EMBEDDING_BATCH_SIZE"):
+        make_embedding_backend(extra_config={"EMBEDDING_BATCH_SIZE": 0})
+
+
+@if_litellm_installed
+async def test_litellm_aembed_concurrent_batches_preserve_order(
+    make_embedding_backend, mocker
+):
+    backend = make_embedding_backend(
+        extra_config={"EMBEDDING_BATCH_SIZE": 1, "EMBEDDING_CONCURRENCY": 3}
+    )
+
+    async def fake_aembedding(*, model, input):
+        # Earlier batches take longer, so they complete out of order
+        index = int(input[0])
+        await asyncio.sleep(0.01 * (4 - index))
+        return litellm.EmbeddingResponse(data=[{"embedding": [float(index)]}])
+
+    embed_mock = mocker.patch(
+        "wagtail_vector_index.ai_utils.backends.litellm.litellm.aembedding",
+        side_effect=fake_aembedding,
+    )
+    embeddings = [embedding async for embedding in backend.aembed(["0", "1", "2", "3"])]
+    assert embeddings == [[0.0], [1.0], [2.0], [3.0]]
+    assert embed_mock.call_count == 4
+
+
+@pytest.fixture
+def embedding_cache_settings(settings):
+    settings.CACHES = {
+        **settings.CACHES,
+        "embeddings": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    }
+    caches["embeddings"].clear()
+
+
+def _fake_embedding_response(*, model, input, **kwargs):
+    return litellm.EmbeddingResponse(
+        data=[{"embedding": [float(len(text))]} for text in input]
+    )
+
+
+@if_litellm_installed
+def test_litellm_embed_uses_cache(
+    embedding_cache_settings, make_embedding_backend, mocker
+):
+    backend = make_embedding_backend(extra_config={"EMBEDDING_CACHE": "embeddings"})
+    embed_mock = mocker.patch(
+        "wagtail_vector_index.ai_utils.backends.litellm.litellm.embedding",
+        side_effect=_fake_embedding_response,
+    )
+
+    assert list(backend.embed(["a", "bb"])) == [[1.0], [2.0]]
+    assert list(backend.embed(["ccc", "a", "bb", "ccc"])) == [
+        [3.0],
+        [1.0],
+        [2.0],
+        [3.0],
+    ]
+    assert embed_mock.call_args_list == [
+        mocker.call(input=["a", "bb"], model=backend.config.model_id),
+        mocker.call(input=["ccc"], model=backend.config.model_id),
+    ]
+
+
+@if_litellm_installed
+async def test_litellm_aembed_uses_cache(
+    embedding_cache_settings, make_embedding_backend, mocker
+):
+    backend = make_embedding_backend(extra_config={"EMBEDDING_CACHE": "embeddings"})
+
+    async def fake_aembedding(*, model, input):
+        return _fake_embedding_response(model=model, input=input)
+
+    embed_mock = mocker.patch(
+        "wagtail_vector_index.ai_utils.backends.litellm.litellm.aembedding",
+        side_effect=fake_aembedding,
+    )
+
+    assert [embedding async for embedding in backend.aembed(["a", "bb"])] == [
+        [1.0],
+        [2.0],
+    ]
+    assert [embedding async for embedding in backend.aembed(["bb", "ccc"])] == [
+        [2.0],
+        [3.0],
+    ]
+    assert embed_mock.call_args_list == [
+        mocker.call(input=["a", "bb"], model=backend.config.model_id),
+        mocker.call(input=["ccc"], model=backend.config.model_id),
+    ]
+
+
+@if_litellm_installed
+def test_litellm_embedding_cache_is_keyed_by_parameters(
+    embedding_cache_settings, make_embedding_backend, mocker
+):
+    embed_mock = mocker.patch(
+        "wagtail_vector_index.ai_utils.backends.litellm.litellm.embedding",
+        side_effect=_fake_embedding_response,
+    )
+    backend = make_embedding_backend(
+        default_parameters={"dimensions": 256},
+        extra_config={
+            "EMBEDDING_CACHE": "embeddings",
+            "EMBEDDING_OUTPUT_DIMENSIONS": 256,
+        },
+    )
+    other_backend = make_embedding_backend(
+        default_parameters={"dimensions": 512},
+        extra_config={
+            "EMBEDDING_CACHE": "embeddings",
+            "EMBEDDING_OUTPUT_DIMENSIONS": 512,
+        },
+    )
+
+    list(backend.embed(["a"]))
+    list(other_backend.embed(["a"]))
+    list(backend.embed(["a"], dimensions=512))
+    list(backend.embed(["a"]))
+
+    assert embed_mock.call_args_list == [
+        mocker.call(input=["a"], model=backend.config.model_id, dimensions=256),
+        mocker.call(input=["a"], model=backend.config.model_id, dimensions=512),
+        mocker.call(input=["a"], model=backend.config.model_id, dimensions=512),
+    ]
+
+
+@if_litellm_installed
+def test_litellm_embedding_cache_ignores_request_options(
+    embedding_cache_settings, make_embedding_backend, mocker
+):
+    embed_mock = mocker.patch(
+        "wagtail_vector_index.ai_utils.backends.litellm.litellm.embedding",
+        side_effect=_fake_embedding_response,
+    )
+    backend = make_embedding_backend(
+        default_parameters={"api_key": "old-key"},
+        extra_config={"EMBEDDING_CACHE": "embeddings"},
+    )
+    rotated_backend = make_embedding_backend(
+        default_parameters={"api_key": "new-key"},
+        extra_config={"EMBEDDING_CACHE": "embeddings"},
+    )
+
+    assert list(backend.embed(["a"])) == [[1.0]]
+    assert list(rotated_backend.embed(["a"], timeout=30, client=object())) == [[1.0]]
+    assert embed_mock.call_count == 1
+
+
+@if_litellm_installed
+async def test_litellm_embedding_cache_rejects_missing_embeddings(
+    embedding_cache_settings, make_embedding_backend, mocker
+):
+    backend = make_embedding_backend(extra_config={"EMBEDDING_CACHE": "embeddings"})
+    short_response = litellm.EmbeddingResponse(data=[{"embedding": [1.0]}])
+    mocker.patch(
+        "wagtail_vector_index.ai_utils.backends.litellm.litellm.embedding",
+        return_value=short_response,
+    )
+    mocker.patch(
+        "wagtail_vector_index.ai_utils.backends.litellm.litellm.aembedding",
+        return_value=short_response,
+    )
+
+    with pytest.raises(ValueError, match="Expected 2 embeddings"):
+        list(backend.embed(["a", "bb"]))
+    with pytest.raises(ValueError, match="Expected 2 embeddings"):
+        [embedding async for embedding in backend.aembed(["a", "bb"])]
+    assert (
+        await backend.cache.aget_many(
+            [
+                backend._cache_key(text, backend._cache_parameters({}))
+                for text in ["a", "bb"]
+            ]
+        )
+        == {}
+    )
+
+
+@if_litellm_installed
+def test_litellm_embedding_cache_must_exist(make_embedding_backend):
+    with pytest.raises(ImproperlyConfigured, match="EMBEDDING_CACHE"):
+        make_embedding_backend(extra_config={"EMBEDDING_CACHE": "missing"})
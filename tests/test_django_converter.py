@@ -7,7 +7,7 @@ from factories import (
     ExamplePageFactory,
 )
 from faker import Faker
-from testapp.models import DifferentPage, ExamplePage
+from testapp.models import DifferentPage, ExampleModel, ExamplePage
 from wagtail_vector_index.ai import get_embedding_backend
 from wagtail_vector_index.storage.django import (
     EmbeddableFieldsDocumentConverter,
@@ -16,6 +16,7 @@ from wagtail_vector_index.storage.django import (
     ModelFromDocumentOperator,
     ModelLabel,
     ModelToDocumentOperator,
+    _get_parent_model_labels,
 )
 
 fake = Faker()
@@ -200,6 +201,12 @@ class TestToDocument:
         assert keys[0] == f"testapp.ExamplePage:{instance.pk}"
         assert keys[1] == f"wagtailcore.Page:{instance.pk}"
 
+    def test_parent_model_labels_match_django_parent_list(self):
+        for model in (ExamplePage, ExampleModel):
+            assert _get_parent_model_labels(model) == tuple(
+                parent._meta.label for parent in model._meta.get_parent_list()
+            )
+
     @pytest.mark.django_db
     def test_generate_documents_returns_documents(self):
         instance = ExamplePageFactory.create(
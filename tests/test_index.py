@@ -121,6 +121,18 @@ def test_embedding_fields_override(patch_embedding_fields):
         assert len(ExamplePage._get_embedding_fields()) == 1
 
 
+def test_embedding_fields_cache_follows_reassignment(patch_embedding_fields):
+    original_fields = ExamplePage._get_embedding_fields()
+    assert ExamplePage._get_embedding_fields() is original_fields
+
+    with patch_embedding_fields(ExamplePage, [EmbeddingField("test")]):
+        assert [field.field_name for field in ExamplePage._get_embedding_fields()] == [
+            "test"
+        ]
+
+    assert ExamplePage._get_embedding_fields() == original_fields
+
+
 def test_checking_search_fields_errors_with_invalid_field(patch_embedding_fields):
     with patch_embedding_fields(ExamplePage, [EmbeddingField("foo")]):
         errors = ExamplePage.check()